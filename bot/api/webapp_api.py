@@ -3,16 +3,25 @@ FastAPI API для WebApp Telegram бота
 """
 from __future__ import annotations
 import os
+import asyncio
+import base64
+import functools
 import hmac
 import hashlib
-import json
+import time
 import datetime as dt
-from typing import Optional, Any
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Optional, Any, Callable, Hashable, Mapping
 from contextlib import asynccontextmanager
+from urllib.parse import parse_qsl
 
-from fastapi import FastAPI, HTTPException, Depends, Header, Query
+import orjson
+
+from fastapi import FastAPI, HTTPException, Depends, Header, Cookie, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, HTMLResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
 
@@ -24,11 +33,32 @@ bot_dir = os.path.dirname(os.path.dirname(current_dir))
 sys.path.insert(0, bot_dir)
 
 from bot.db import Database, now_iso
+from bot.utils import gen_payment_code
 
 # Конфигурация
 DB_PATH = os.getenv("DB_PATH", "./data.db")
 BOT_TOKEN = os.getenv("BOT_TOKEN", "")
 
+# Ключ подписи WebApp зависит только от токена — считаем один раз
+_SECRET_KEY = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest() if BOT_TOKEN else None
+
+# Время на оплату после выдачи реквизитов
+APP_TTL_MINUTES = 20
+_APP_TTL = dt.timedelta(minutes=APP_TTL_MINUTES)
+_UTC = dt.timezone.utc
+
+# Подписи статусов заявок (неизменяемые, общие для всех запросов)
+STATUS_LABELS: Mapping[str, str] = MappingProxyType({
+    "WAITING_MERCHANT": "Ожидает мерчанта",
+    "MERCHANT_TAKEN": "Взята мерчантом",
+    "WAITING_PAYMENT": "Ожидает оплату",
+    "WAITING_RECEIPT": "Ожидает чек",
+    "WAITING_CHECK": "На проверке",
+    "CONFIRMED": "Подтверждено",
+    "REJECTED": "Отклонено",
+    "EXPIRED": "Истекло время",
+})
+
 # Глобальная переменная для БД
 db: Optional[Database] = None
 
@@ -44,12 +74,14 @@ async def lifespan(app: FastAPI):
     print(f"✅ DB initialized at: {DB_PATH}")
     print(f"✅ WebApp dir: {WEBAPP_DIR} (exists: {os.path.exists(WEBAPP_DIR)})")
     yield
+    await db.close()
 
 app = FastAPI(
     title="NightLab WebApp API",
     description="API для Telegram Mini App",
     version="2.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS для WebApp (Telegram WebView)
@@ -61,12 +93,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Раздаем статические файлы WebApp
-if os.path.exists(WEBAPP_DIR):
-    app.mount("/static", StaticFiles(directory=WEBAPP_DIR), name="static")
-    print(f"✅ Mounted static files from {WEBAPP_DIR}")
-else:
-    print(f"⚠️ WebApp directory not found at {WEBAPP_DIR}")
+# Сжатие ответов: JSON со списками заявок/уведомлений хорошо жмется,
+# а клиенты — мобильные WebView. Мелкие ответы не трогаем.
+# Статика (index.html, app.js, styles.css) жмется заново на каждый запрос,
+# поэтому уровень 5 вместо дефолтного 9: почти тот же размер, меньше CPU.
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
 
 # ============ Pydantic Models ============
 
@@ -88,6 +119,54 @@ class CreateAppResponse(BaseModel):
 
 # ============ Telegram Auth ============
 
+# Кэш проверенных initData: blake2b(init_data) -> (user, auth_date)
+AUTH_CACHE_SIZE = 4096
+_auth_cache: OrderedDict[bytes, tuple[dict[str, Any], int]] = OrderedDict()
+
+def _verify_and_parse(init_data: str) -> tuple[dict[str, Any], int]:
+    """Проверяет HMAC-подпись initData и возвращает (user, auth_date)"""
+    # parse_qsl разбирает пары и декодирует каждое значение за один проход
+    params = dict(parse_qsl(init_data, keep_blank_values=True))
+
+    received_hash = params.pop("hash", "")
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(params.items()))
+    calculated_hash = hmac.new(_SECRET_KEY, data_check_string.encode(), hashlib.sha256).hexdigest()
+
+    if not hmac.compare_digest(calculated_hash, received_hash):
+        # Для тестирования можно временно отключить проверку:
+        # return {"id": 7978852869, "username": "TEDDY_lab"}, int(time.time())
+        raise HTTPException(status_code=401, detail="Invalid init data signature")
+
+    auth_date = int(params.get("auth_date", 0))
+    user_data = orjson.loads(params.get("user", "{}"))
+    return user_data, auth_date
+
+def _init_data_digest(init_data: str) -> bytes:
+    return hashlib.blake2b(init_data.encode(), digest_size=16).digest()
+
+def _check_init_data(init_data: str, cache_key: bytes) -> tuple[dict[str, Any], int]:
+    """(user, auth_date) для initData: LRU-кэш, на промахе — проверка HMAC"""
+    try:
+        # WebApp шлет один и тот же initData всю сессию — HMAC считаем только на промахе
+        cached = _auth_cache.get(cache_key)
+        if cached is None:
+            cached = _verify_and_parse(init_data)
+            _auth_cache[cache_key] = cached
+            if len(_auth_cache) > AUTH_CACHE_SIZE:
+                _auth_cache.popitem(last=False)
+        else:
+            _auth_cache.move_to_end(cache_key)
+
+        user_data, auth_date = cached
+        if time.time() - auth_date > 86400:
+            _auth_cache.pop(cache_key, None)
+            raise HTTPException(status_code=401, detail="Init data expired")
+
+        return cached
+    except Exception as e:
+        print(f"Auth error: {e}")
+        raise HTTPException(status_code=401, detail=f"Auth failed: {str(e)}")
+
 def validate_telegram_init_data(init_data: str) -> dict[str, Any]:
     """Проверяет подпись initData от Telegram WebApp"""
     if not BOT_TOKEN:
@@ -96,62 +175,138 @@ def validate_telegram_init_data(init_data: str) -> dict[str, Any]:
     if not init_data or init_data == 'test_mode':
         return {"id": 123456, "username": "test_user"}
 
+    return _check_init_data(init_data, _init_data_digest(init_data))[0]
+
+# ============ Session Cookie ============
+# После проверки initData выдаем подписанную куку "{tg_id}.{exp}.{user_b64}.{sig}".
+# Пока кука жива, WebApp не шлет X-Init-Data (~1 КБ) и сервер проверяет
+# одну HMAC-подпись. Если initData в запросе есть, он главнее куки.
+# В отличие от LRU-кэша, кука работает во всех воркерах и после рестарта.
+
+SESSION_COOKIE = "nl_sess"
+SESSION_TTL = 3600
+
+# Отдельный ключ для сессий, чтобы не подписывать их ключом WebAppData
+_SESSION_KEY = hmac.new(_SECRET_KEY, b"nl_sess", hashlib.sha256).digest() if _SECRET_KEY else None
+
+def _session_sign(body: str) -> bytes:
+    return hmac.new(_SESSION_KEY, body.encode(), hashlib.sha256).hexdigest().encode()
+
+def _make_session(user: dict[str, Any], exp: int) -> str:
+    body = f"{user.get('id')}.{exp}.{base64.urlsafe_b64encode(orjson.dumps(user)).decode()}"
+    return f"{body}.{_session_sign(body).decode()}"
+
+def _read_session(cookie: str) -> Optional[dict[str, Any]]:
+    """Пользователь из куки или None, если подпись не сошлась или срок вышел"""
+    body, _, sig = cookie.rpartition(".")
+    if not body or not hmac.compare_digest(_session_sign(body), sig.encode()):
+        return None
+    _, exp, user_b64 = body.split(".", 2)
+    if not exp.isdigit() or int(exp) < time.time():
+        return None
     try:
-        # ИСПРАВЛЕНО: Декодируем URL-encoded строку
-        from urllib.parse import unquote
-        init_data = unquote(init_data)
-        
-        params = {}
-        for pair in init_data.split("&"):
-            if "=" in pair:
-                key, value = pair.split("=", 1)
-                params[key] = value
-
-        received_hash = params.pop("hash", "")
-        data_check_string = "\n".join([f"{k}={v}" for k, v in sorted(params.items())])
-        secret_key = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
-        calculated_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
-
-        if calculated_hash != received_hash:
-            # Для тестирования можно временно отключить проверку:
-            # return {"id": 7978852869, "username": "TEDDY_lab"}
-            raise HTTPException(status_code=401, detail="Invalid init data signature")
-
-        import time
-        auth_date = int(params.get("auth_date", 0))
-        if time.time() - auth_date > 86400:
-            raise HTTPException(status_code=401, detail="Init data expired")
+        return orjson.loads(base64.urlsafe_b64decode(user_b64))
+    except (ValueError, orjson.JSONDecodeError):
+        return None
+
+async def get_current_user(
+    response: Response,
+    x_init_data: Optional[str] = Header(None),
+    session: Optional[str] = Cookie(None, alias=SESSION_COOKIE),
+) -> dict[str, Any]:
+    """Пользователь из заголовка X-Init-Data или, если его нет, из сессионной куки"""
+    if x_init_data is None:
+        user = _read_session(session) if session and _SESSION_KEY else None
+        if user is None:
+            # Клиент повторит запрос с X-Init-Data
+            raise HTTPException(status_code=401, detail="Session expired")
+        response.headers["X-Auth-Cache"] = "hit"
+        return user
+
+    if not BOT_TOKEN or not x_init_data or x_init_data == 'test_mode':
+        return validate_telegram_init_data(x_init_data)
+
+    user, auth_date = _check_init_data(x_init_data, _init_data_digest(x_init_data))
+    # Кука выдается, если ее нет или она другого пользователя (смена аккаунта)
+    if not session or session.partition(".")[0] != str(user.get("id")):
+        now = int(time.time())
+        exp = min(now + SESSION_TTL, auth_date + 86400)
+        response.set_cookie(
+            SESSION_COOKIE, _make_session(user, exp),
+            max_age=exp - now, httponly=True, secure=True, samesite="strict",
+        )
+        # Сигнал клиенту: дальше можно без X-Init-Data (кука HttpOnly, JS ее не видит)
+        response.headers["X-Auth-Session"] = "issued"
+    return user
+
+# ============ Cache ============
+
+def async_cached(ttl: float, key: Optional[Callable[..., Hashable]] = None, maxsize: int = 128):
+    """TTL-кэш для async-функций.
+
+    Хранит future, поэтому одновременные промахи ждут один запрос к БД.
+    Ошибки не кэшируются. Не больше ``maxsize`` ключей: при вставке
+    выкидываются просроченные, затем самые старые. Сброс: ``func.cache_clear()``.
+    """
+    def decorator(func):
+        cache: OrderedDict[Hashable, tuple[float, asyncio.Future]] = OrderedDict()
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            entry = cache.get(cache_key)
+            if entry is None or entry[0] <= now:
+                entry = (now + ttl, asyncio.ensure_future(func(*args, **kwargs)))
+                cache[cache_key] = entry
+                cache.move_to_end(cache_key)
+                if len(cache) > maxsize:
+                    for stale in [k for k, (expires, _) in cache.items() if expires <= now]:
+                        del cache[stale]
+                    while len(cache) > maxsize:
+                        cache.popitem(last=False)
+            future = entry[1]
+            try:
+                # shield: отмена одного клиента не отменяет общий запрос
+                return await asyncio.shield(future)
+            except Exception:
+                if cache.get(cache_key) is entry:
+                    del cache[cache_key]
+                raise
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+@async_cached(ttl=60)
+async def _load_stats() -> dict[str, Any]:
+    stats = await db.get_stats()
+    return {
+        "total_applications": stats.get("total_applications", 0),
+        "total_users": stats.get("total_users", 0),
+        "turnover": float(stats.get("turnover", 0)),
+        "today_applications": stats.get("today_applications", 0)
+    }
 
-        user_data = json.loads(params.get("user", "{}"))
-        return user_data
-    except Exception as e:
-        print(f"Auth error: {e}")
-        raise HTTPException(status_code=401, detail=f"Auth failed: {str(e)}")
-        
-# ============ WebApp Routes ============
+@async_cached(ttl=300)
+async def _load_countries() -> list[dict[str, Any]]:
+    countries = await db.list_countries(active_only=True)
+    return [{"id": c[0], "name": c[1], "is_active": bool(c[2])} for c in countries]
 
-@app.get("/")
-async def serve_webapp():
-    """Отдает основной HTML WebApp"""
-    index_path = os.path.join(WEBAPP_DIR, "index.html")
-    
-    if os.path.exists(index_path):
-        with open(index_path, "r", encoding="utf-8") as f:
-            content = f.read()
-            # Заменяем относительные пути на /static/
-            content = content.replace('href="styles.css"', 'href="/static/styles.css"')
-            content = content.replace('src="app.js"', 'src="/static/app.js"')
-            return HTMLResponse(content=content)
-    
-    return HTMLResponse(content=f"""
-    <html>
-        <body style="background:#0f0f1a; color:white; font-family:Arial; padding:40px; text-align:center;">
-            <h1>⚠️ WebApp Not Found</h1>
-            <p>Expected: {index_path}</p>
-            <p>Base dir: {BASE_DIR}</p>
-        </body>
-    </html>
-    """)
+@async_cached(ttl=300, key=lambda country_id: country_id, maxsize=256)
+async def _load_banks(country_id: Optional[int]) -> list[dict[str, Any]]:
+    if country_id:
+        banks = await db.list_banks_by_country(country_id, active_only=True)
+    else:
+        banks = await db.list_banks(active_only=True)
+    return [{"id": b[0], "name": b[1], "is_active": bool(b[2])} for b in banks]
+
+# Правки стран/банков (админка бота, тот же процесс) сбрасывают кэш сразу;
+# из другого процесса они видны по истечении TTL
+Database.add_catalog_listener(_load_countries.cache_clear)
+Database.add_catalog_listener(_load_banks.cache_clear)
+
+# ============ Service Routes ============
 
 @app.get("/health")
 async def health():
@@ -168,13 +323,7 @@ async def health():
 async def get_stats():
     """Общая статистика"""
     try:
-        stats = await db.get_stats()
-        return {
-            "total_applications": stats.get("total_applications", 0),
-            "total_users": stats.get("total_users", 0),
-            "turnover": float(stats.get("turnover", 0)),
-            "today_applications": stats.get("today_applications", 0)
-        }
+        return await _load_stats()
     except Exception as e:
         print(f"Stats error: {e}")
         return {"total_applications": 0, "total_users": 0, "turnover": 0, "today_applications": 0}
@@ -187,15 +336,14 @@ async def get_user_profile(user: dict = Depends(get_current_user)):
         username = user.get("username", f"user_{tg_id}")
         
         await db.upsert_user(tg_id, username)
-        user_data = await db.get_user(tg_id)
+        user_data, referral_count = await asyncio.gather(
+            db.get_user(tg_id),
+            db.get_referral_count(tg_id),
+        )
         
         if not user_data:
             raise HTTPException(status_code=404, detail="User not found")
 
-        referral_count = await db.get_referral_count(tg_id)
-        
-        # Получаем URL бота для реферальной ссылки
-        webapp_url = await db.get_setting("webapp_url", "")
         bot_username = "NightLab_ROBOT"  # Укажи свой бот
         
         return {
@@ -237,29 +385,21 @@ async def get_user_applications(
     """Список заявок"""
     try:
         tg_id = user.get("id")
-        STATUS_LABELS = {
-            "WAITING_MERCHANT": "Ожидает мерчанта",
-            "MERCHANT_TAKEN": "Взята мерчантом",
-            "WAITING_PAYMENT": "Ожидает оплату",
-            "WAITING_RECEIPT": "Ожидает чек",
-            "WAITING_CHECK": "На проверке",
-            "CONFIRMED": "Подтверждено",
-            "REJECTED": "Отклонено",
-            "EXPIRED": "Истекло время",
-        }
         rows = await db.list_user_apps(tg_id, limit=limit, offset=offset, status_filter=status)
-        return [
-            {
-                "id": row[0],
-                "bank_name": row[1],
-                "amount_uah": float(row[2]),
-                "payment_code": row[3],
-                "status": row[4],
-                "status_label": STATUS_LABELS.get(row[4], row[4]),
-                "created_at": row[5]
+        # До 100 строк на запрос: без лишних поисков атрибутов в цикле
+        label_get = STATUS_LABELS.get
+        out: list[Any] = [None] * len(rows)
+        for i, (app_id, bank_name, amount_uah, payment_code, app_status, created_at) in enumerate(rows):
+            out[i] = {
+                "id": app_id,
+                "bank_name": bank_name,
+                "amount_uah": float(amount_uah),
+                "payment_code": payment_code,
+                "status": app_status,
+                "status_label": label_get(app_status, app_status),
+                "created_at": created_at
             }
-            for row in rows
-        ]
+        return out
     except Exception as e:
         print(f"Applications error: {e}")
         return []
@@ -279,26 +419,25 @@ async def create_application(data: ApplicationCreate):
             return CreateAppResponse(success=False, message="Сумма должна быть больше 0")
 
         bank = await db.get_bank(data.bank_id)
-        if not bank:
+        if not bank or not bank["is_active"]:
             return CreateAppResponse(success=False, message="Банк не найден")
 
         country = await db.get_country(data.country_id)
         country_name = country["name"] if country else "Unknown"
 
         # Генерируем код
-        import random
-        import string
-        payment_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+        payment_code = gen_payment_code()
         
         app_id = await db.create_application(tg_id, data.bank_id, data.amount_uah, payment_code)
+        _load_stats.cache_clear()
 
         requisites = bank.get("requisites_text", "").strip()
         has_requisites = requisites and len(requisites) > 5 and "не заданы" not in requisites
 
         if has_requisites:
             # Автовыдача
-            await db.set_requisites_and_start_timer(app_id, requisites, ttl_minutes=20)
-            expires_at = (dt.datetime.utcnow() + dt.timedelta(minutes=20)).isoformat() + "Z"
+            await db.set_requisites_and_start_timer(app_id, requisites, ttl_minutes=APP_TTL_MINUTES)
+            expires_at = (dt.datetime.now(_UTC) + _APP_TTL).isoformat(timespec="seconds").replace("+00:00", "Z")
             
             return CreateAppResponse(
                 success=True, 
@@ -331,8 +470,7 @@ async def create_application(data: ApplicationCreate):
 async def get_countries():
     """Список стран"""
     try:
-        countries = await db.list_countries(active_only=True)
-        return [{"id": c[0], "name": c[1], "is_active": bool(c[2])} for c in countries]
+        return await _load_countries()
     except Exception as e:
         print(f"Countries error: {e}")
         return []
@@ -341,11 +479,7 @@ async def get_countries():
 async def get_banks(country_id: Optional[int] = Query(None)):
     """Список банков"""
     try:
-        if country_id:
-            banks = await db.list_banks_by_country(country_id, active_only=True)
-        else:
-            banks = await db.list_banks(active_only=True)
-        return [{"id": b[0], "name": b[1], "is_active": bool(b[2])} for b in banks]
+        return await _load_banks(country_id)
     except Exception as e:
         print(f"Banks error: {e}")
         return []
@@ -398,26 +532,14 @@ async def get_application_detail(app_id: int, user: dict = Depends(get_current_u
     """Детали заявки"""
     try:
         tg_id = user.get("id")
-        app = await db.get_application(app_id)
+        app = await db.get_application_with_bank(app_id)
         
         if not app or app["user_tg_id"] != tg_id:
             raise HTTPException(status_code=403, detail="Access denied")
 
-        bank = await db.get_bank(app["bank_id"]) if app.get("bank_id") else None
-        STATUS_LABELS = {
-            "WAITING_MERCHANT": "Ожидает мерчанта",
-            "MERCHANT_TAKEN": "Взята мерчантом",
-            "WAITING_PAYMENT": "Ожидает оплату",
-            "WAITING_RECEIPT": "Ожидает чек",
-            "WAITING_CHECK": "На проверке",
-            "CONFIRMED": "Подтверждено",
-            "REJECTED": "Отклонено",
-            "EXPIRED": "Истекло время",
-        }
-        
         return {
             "id": app["id"],
-            "bank_name": bank["bank_name"] if bank else "Unknown",
+            "bank_name": app["bank_name"] or "Unknown",
             "amount_uah": float(app["amount_uah"]),
             "payment_code": app["payment_code"],
             "status": app["status"],
@@ -431,7 +553,31 @@ async def get_application_detail(app_id: int, user: dict = Depends(get_current_u
         print(f"App detail error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ============ WebApp Static ============
+# Монтируем последним: маршруты /api/* и /health матчатся раньше.
+# index.html, styles.css и app.js отдаются как есть, без переписывания путей.
+if os.path.exists(WEBAPP_DIR):
+    app.mount("/", StaticFiles(directory=WEBAPP_DIR, html=True), name="webapp")
+    print(f"✅ Mounted WebApp from {WEBAPP_DIR}")
+else:
+    print(f"⚠️ WebApp directory not found at {WEBAPP_DIR}")
+
+    @app.get("/")
+    async def serve_webapp():
+        """Заглушка, если каталог WebApp не найден"""
+        index_path = os.path.join(WEBAPP_DIR, "index.html")
+        return HTMLResponse(content=f"""
+        <html>
+            <body style="background:#0f0f1a; color:white; font-family:Arial; padding:40px; text-align:center;">
+                <h1>⚠️ WebApp Not Found</h1>
+                <p>Expected: {index_path}</p>
+                <p>Base dir: {BASE_DIR}</p>
+            </body>
+        </html>
+        """)
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    uvicorn.run("bot.api.webapp_api:app", host="0.0.0.0", port=port, workers=workers)
@@ -1,9 +1,15 @@
 from __future__ import annotations
+import asyncio
 import aiosqlite
 import datetime as dt
-from typing import Optional, Any
+from contextlib import asynccontextmanager
+from typing import Optional, Any, AsyncIterator, Callable
 
-SCHEMA = """
+# Статусы, чьи суммы входят в оборот (turnover в stats_counters)
+TURNOVER_STATUSES = ("CONFIRMED", "WAITING_PAYMENT", "WAITING_RECEIPT", "WAITING_CHECK")
+_TURNOVER_STATUSES_SQL = "(" + ", ".join(f"'{status}'" for status in TURNOVER_STATUSES) + ")"
+
+SCHEMA = f"""
 PRAGMA foreign_keys = ON;
 
 CREATE TABLE IF NOT EXISTS users (
@@ -99,18 +105,147 @@ CREATE TABLE IF NOT EXISTS referrals (
     FOREIGN KEY(referred_tg_id) REFERENCES users(tg_id),
     UNIQUE(referred_tg_id)
 );
+
+-- Агрегаты для /api/stats, ведутся триггерами при записи.
+-- Триггеры пересоздаются при старте, чтобы совпадать с TURNOVER_STATUSES.
+CREATE TABLE IF NOT EXISTS stats_counters (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_applications_created_at ON applications(created_at);
+
+DROP TRIGGER IF EXISTS trg_stats_app_insert;
+CREATE TRIGGER trg_stats_app_insert AFTER INSERT ON applications
+BEGIN
+    UPDATE stats_counters SET value = value + 1 WHERE name = 'total_applications';
+    UPDATE stats_counters SET value = value + NEW.amount_uah
+    WHERE name = 'turnover'
+      AND NEW.status IN {_TURNOVER_STATUSES_SQL};
+END;
+
+DROP TRIGGER IF EXISTS trg_stats_app_update;
+CREATE TRIGGER trg_stats_app_update AFTER UPDATE OF status, amount_uah ON applications
+BEGIN
+    UPDATE stats_counters SET value = value
+        - CASE WHEN OLD.status IN {_TURNOVER_STATUSES_SQL}
+               THEN OLD.amount_uah ELSE 0 END
+        + CASE WHEN NEW.status IN {_TURNOVER_STATUSES_SQL}
+               THEN NEW.amount_uah ELSE 0 END
+    WHERE name = 'turnover';
+END;
+
+DROP TRIGGER IF EXISTS trg_stats_app_delete;
+CREATE TRIGGER trg_stats_app_delete AFTER DELETE ON applications
+BEGIN
+    UPDATE stats_counters SET value = value - 1 WHERE name = 'total_applications';
+    UPDATE stats_counters SET value = value - OLD.amount_uah
+    WHERE name = 'turnover'
+      AND OLD.status IN {_TURNOVER_STATUSES_SQL};
+END;
+
+DROP TRIGGER IF EXISTS trg_stats_user_insert;
+CREATE TRIGGER trg_stats_user_insert AFTER INSERT ON users
+BEGIN
+    UPDATE stats_counters SET value = value + 1 WHERE name = 'total_users';
+END;
+
+DROP TRIGGER IF EXISTS trg_stats_user_delete;
+CREATE TRIGGER trg_stats_user_delete AFTER DELETE ON users
+BEGIN
+    UPDATE stats_counters SET value = value - 1 WHERE name = 'total_users';
+END;
 """
 
+# Настройки соединения: WAL дает параллельных читателей при одном писателе,
+# synchronous=NORMAL в WAL-режиме fsync'ает только на checkpoint.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA foreign_keys=ON",
+)
+
+# Размер кэша подготовленных выражений sqlite3 (по умолчанию 128).
+# Ключ кэша — текст SQL, поэтому запросы собираются только из
+# фиксированных фрагментов, а значения идут через параметры.
+CACHED_STATEMENTS = 256
+
 def now_iso() -> str:
     return dt.datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
 
 class Database:
+    # Подписчики на изменения стран/банков (например, сброс кэшей API).
+    # Общие для всех экземпляров: бот и API в одном процессе видят правки друг друга.
+    _catalog_listeners: list[Callable[[], None]] = []
+
+    @classmethod
+    def add_catalog_listener(cls, callback: Callable[[], None]) -> None:
+        cls._catalog_listeners.append(callback)
+
+    def _catalog_changed(self) -> None:
+        for callback in self._catalog_listeners:
+            callback()
+
     def __init__(self, path: str):
         self.path = path
         self._app_cols: set[str] | None = None
+        # Писатель и отдельный читатель: в WAL читатель видит только
+        # закоммиченные данные и не ждет транзакцию писателя
+        self._conn: aiosqlite.Connection | None = None
+        self._read_conn: aiosqlite.Connection | None = None
+        self._connect_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+
+    async def _open(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path, cached_statements=CACHED_STATEMENTS)
+        for pragma in PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
+    async def _connect(self) -> aiosqlite.Connection:
+        """Открывает соединения один раз на экземпляр, возвращает писателя"""
+        if self._conn is None:
+            async with self._connect_lock:
+                if self._conn is None:
+                    writer = await self._open()
+                    try:
+                        self._read_conn = await self._open()
+                    except BaseException:
+                        await writer.close()
+                        raise
+                    self._conn = writer
+        return self._conn
+
+    @asynccontextmanager
+    async def _read(self) -> AsyncIterator[aiosqlite.Connection]:
+        await self._connect()
+        yield self._read_conn
+
+    @asynccontextmanager
+    async def _write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Писатели идут по очереди; при ошибке транзакция откатывается"""
+        async with self._write_lock:
+            conn = await self._connect()
+            try:
+                yield conn
+            except BaseException:
+                await conn.rollback()
+                raise
+
+    async def close(self) -> None:
+        """Закрывает соединения (их потоки не daemon — без close процесс не завершится)"""
+        async with self._connect_lock:
+            for conn in (self._read_conn, self._conn):
+                if conn is not None:
+                    await conn.close()
+            self._conn = None
+            self._read_conn = None
 
     async def init(self) -> None:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             await db.executescript(SCHEMA)
 
             async def cols(table: str) -> set[str]:
@@ -168,17 +303,33 @@ class Database:
                     WHERE bank_id IS NULL AND bank_name IS NOT NULL
                     """
                 )
+
+            # Счетчики статистики пересчитываем при старте, дальше их ведут триггеры
+            await db.execute(
+                f"""
+                INSERT INTO stats_counters (name, value)
+                SELECT * FROM (
+                    SELECT 'total_applications', COUNT(*) FROM applications
+                    UNION ALL
+                    SELECT 'total_users', COUNT(*) FROM users
+                    UNION ALL
+                    SELECT 'turnover', COALESCE(SUM(amount_uah), 0) FROM applications
+                    WHERE status IN {_TURNOVER_STATUSES_SQL}
+                ) WHERE true
+                ON CONFLICT(name) DO UPDATE SET value=excluded.value
+                """
+            )
             await db.commit()
 
     # === Settings ===
     async def get_setting(self, key: str, default: str = "") -> str:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute("SELECT value FROM settings WHERE key=?", (key,))
             row = await cur.fetchone()
             return row[0] if row else default
 
     async def set_setting(self, key: str, value: str) -> None:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             await db.execute(
                 """INSERT INTO settings (key, value, updated_at) VALUES (?, ?, ?)
                    ON CONFLICT(key) DO UPDATE SET value=excluded.value, updated_at=excluded.updated_at""",
@@ -192,12 +343,12 @@ class Database:
         if active_only:
             q += " WHERE is_active=1"
         q += " ORDER BY name"
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute(q)
             return await cur.fetchall()
 
     async def get_country(self, country_id: int) -> Optional[dict[str, Any]]:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute("SELECT id, name, is_active FROM countries WHERE id=?", (country_id,))
             row = await cur.fetchone()
             if not row:
@@ -205,18 +356,20 @@ class Database:
             return {"id": row[0], "name": row[1], "is_active": bool(row[2])}
 
     async def upsert_country(self, name: str) -> None:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             await db.execute(
                 """INSERT INTO countries (name, is_active, created_at) VALUES (?, 1, ?)
                    ON CONFLICT(name) DO UPDATE SET is_active=1""",
                 (name, now_iso())
             )
             await db.commit()
+        self._catalog_changed()
 
     async def set_country_active(self, country_id: int, is_active: bool) -> None:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             await db.execute("UPDATE countries SET is_active=? WHERE id=?", (1 if is_active else 0, country_id))
             await db.commit()
+        self._catalog_changed()
 
     # === Banks ===
     async def list_banks(self, active_only: bool = True) -> list[tuple[int, str, int]]:
@@ -224,7 +377,7 @@ class Database:
         if active_only:
             q += " WHERE is_active=1"
         q += " ORDER BY bank_name"
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute(q)
             return await cur.fetchall()
 
@@ -233,12 +386,12 @@ class Database:
         if active_only:
             q += " AND is_active=1"
         q += " ORDER BY bank_name"
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute(q, (country_id,))
             return await cur.fetchall()
 
     async def get_bank(self, bank_id: int) -> Optional[dict[str, Any]]:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute(
                 "SELECT id, country_id, bank_name, requisites_text, is_active FROM bank_accounts WHERE id=?",
                 (bank_id,),
@@ -249,7 +402,7 @@ class Database:
             return {"id": row[0], "country_id": row[1], "bank_name": row[2], "requisites_text": row[3], "is_active": bool(row[4])}
 
     async def upsert_bank(self, bank_name: str, requisites_text: str, country_id: int = 1) -> None:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             cur = await db.execute("SELECT id, country_id FROM bank_accounts WHERE bank_name=?", (bank_name,))
             row = await cur.fetchone()
             if row:
@@ -264,16 +417,18 @@ class Database:
                     (country_id, bank_name, requisites_text, now_iso())
                 )
             await db.commit()
+        self._catalog_changed()
 
     async def set_bank_active(self, bank_id: int, is_active: bool) -> None:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             await db.execute("UPDATE bank_accounts SET is_active=? WHERE id=?", (1 if is_active else 0, bank_id))
             await db.commit()
+        self._catalog_changed()
 
     # === Applications ===
     async def create_application(self, user_tg_id: int, bank_id: int, amount_uah: float, payment_code: str) -> int:
         created = now_iso()
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             cur = await db.execute(
                 """
                 INSERT INTO applications (user_tg_id, bank_id, amount_uah, payment_code, status, created_at, updated_at)
@@ -285,7 +440,7 @@ class Database:
             return cur.lastrowid
 
     async def get_application(self, app_id: int) -> Optional[dict[str, Any]]:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute(
                 """
                 SELECT id, user_tg_id, bank_id, amount_uah, payment_code, status,
@@ -307,8 +462,34 @@ class Database:
             ]
             return dict(zip(keys, row))
 
+    async def get_application_with_bank(self, app_id: int) -> Optional[dict[str, Any]]:
+        """Заявка вместе с bank_name одним запросом (LEFT JOIN)"""
+        async with self._read() as db:
+            cur = await db.execute(
+                """
+                SELECT a.id, a.user_tg_id, a.bank_id, a.amount_uah, a.payment_code, a.status,
+                       a.created_at, a.requisites_sent_at, a.expires_at, a.updated_at,
+                       a.assigned_merchant_tg_id, a.requisites_text_override,
+                       a.receipt_file_id, a.receipt_file_type, b.bank_name
+                FROM applications a
+                LEFT JOIN bank_accounts b ON b.id=a.bank_id
+                WHERE a.id=?
+                """,
+                (app_id,),
+            )
+            row = await cur.fetchone()
+            if not row:
+                return None
+            keys = [
+                "id","user_tg_id","bank_id","amount_uah","payment_code","status",
+                "created_at","requisites_sent_at","expires_at","updated_at",
+                "assigned_merchant_tg_id","requisites_text_override",
+                "receipt_file_id","receipt_file_type","bank_name"
+            ]
+            return dict(zip(keys, row))
+
     async def list_user_apps(self, user_tg_id: int, limit: int = 20, offset: int = 0, status_filter: str | None = None) -> list[tuple]:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             query = """
                 SELECT a.id, COALESCE(b.bank_name, '[UNKNOWN]') as bank_name, a.amount_uah, a.payment_code, a.status, a.created_at
                 FROM applications a
@@ -325,7 +506,7 @@ class Database:
             return await cur.fetchall()
 
     async def count_user_apps(self, user_tg_id: int, status_filter: str | None = None) -> int:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             query = "SELECT COUNT(*) FROM applications WHERE user_tg_id=?"
             params = [user_tg_id]
             if status_filter:
@@ -336,7 +517,7 @@ class Database:
             return row[0] if row else 0
 
     async def assign_merchant(self, app_id: int, merchant_tg_id: int) -> bool:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             cur = await db.execute(
                 """
                 UPDATE applications
@@ -350,7 +531,7 @@ class Database:
 
     async def unassign_merchant(self, app_id: int, merchant_tg_id: int | None = None) -> bool:
         now = now_iso()
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             if merchant_tg_id is None:
                 cur = await db.execute(
                     """
@@ -376,7 +557,7 @@ class Database:
         created = dt.datetime.utcnow().replace(microsecond=0)
         sent = created.isoformat() + "Z"
         exp = (created + dt.timedelta(minutes=ttl_minutes)).isoformat() + "Z"
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             cur = await db.execute(
                 """
                 UPDATE applications
@@ -389,12 +570,12 @@ class Database:
             return cur.rowcount == 1
 
     async def set_app_status(self, app_id: int, status: str) -> None:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             await db.execute("UPDATE applications SET status=?, updated_at=? WHERE id=?", (status, now_iso(), app_id))
             await db.commit()
 
     async def set_receipt(self, app_id: int, file_id: str, file_type: str) -> None:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             await db.execute(
                 "UPDATE applications SET receipt_file_id=?, receipt_file_type=?, updated_at=? WHERE id=?",
                 (file_id, file_type, now_iso(), app_id),
@@ -403,7 +584,7 @@ class Database:
 
     async def expire_overdue(self) -> list[int]:
         now = now_iso()
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             cur = await db.execute(
                 "SELECT id FROM applications WHERE status='WAITING_PAYMENT' AND expires_at IS NOT NULL AND expires_at < ?",
                 (now,),
@@ -419,7 +600,7 @@ class Database:
             return ids
 
     async def add_message(self, app_id: int, from_tg_id: int, to_tg_id: int, text: str) -> None:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             await db.execute(
                 "INSERT INTO messages (app_id, from_tg_id, to_tg_id, text, created_at) VALUES (?, ?, ?, ?, ?)",
                 (app_id, from_tg_id, to_tg_id, text, now_iso()),
@@ -428,13 +609,13 @@ class Database:
 
     # === Users ===
     async def user_exists(self, tg_id: int) -> bool:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute("SELECT 1 FROM users WHERE tg_id=? LIMIT 1", (tg_id,))
             row = await cur.fetchone()
             return bool(row)
 
-        async def upsert_user(self, tg_id: int, username: str) -> None:
-        async with aiosqlite.connect(self.path) as db:
+    async def upsert_user(self, tg_id: int, username: str) -> None:
+        async with self._write() as db:
             # Проверяем существование
             cur = await db.execute("SELECT tg_id FROM users WHERE tg_id=?", (tg_id,))
             row = await cur.fetchone()
@@ -449,7 +630,7 @@ class Database:
             await db.commit()
 
     async def get_user(self, tg_id: int) -> Optional[dict[str, Any]]:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute(
                 "SELECT tg_id, username, role, balance_uah, referral_code, referred_by, created_at FROM users WHERE tg_id=?",
                 (tg_id,)
@@ -468,7 +649,7 @@ class Database:
             }
 
     async def get_user_by_referral_code(self, referral_code: str) -> Optional[dict[str, Any]]:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute(
                 "SELECT tg_id, username, role, balance_uah, referral_code, referred_by, created_at FROM users WHERE referral_code=?",
                 (referral_code,)
@@ -487,24 +668,24 @@ class Database:
             }
 
     async def get_user_role(self, tg_id: int) -> str:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute("SELECT role FROM users WHERE tg_id=?", (tg_id,))
             row = await cur.fetchone()
             return row[0] if row else "USER"
 
     async def set_user_role(self, tg_id: int, role: str) -> None:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             await db.execute("UPDATE users SET role=? WHERE tg_id=?", (role, tg_id))
             await db.commit()
 
     async def get_username(self, tg_id: int) -> str | None:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute("SELECT username FROM users WHERE tg_id=?", (tg_id,))
             row = await cur.fetchone()
             return row[0] if row else None
 
     async def update_balance(self, tg_id: int, amount: float) -> None:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             await db.execute(
                 "UPDATE users SET balance_uah = balance_uah + ? WHERE tg_id=?",
                 (amount, tg_id)
@@ -513,33 +694,25 @@ class Database:
 
     # === Statistics ===
     async def get_stats(self) -> dict[str, Any]:
-        async with aiosqlite.connect(self.path) as db:
-            # Total applications
-            cur = await db.execute("SELECT COUNT(*) FROM applications")
-            total_apps = (await cur.fetchone())[0]
-
-            # Total users
-            cur = await db.execute("SELECT COUNT(*) FROM users")
-            total_users = (await cur.fetchone())[0]
-
-            # Total turnover
-            cur = await db.execute("SELECT COALESCE(SUM(amount_uah), 0) FROM applications WHERE status IN ('CONFIRMED', 'WAITING_PAYMENT', 'WAITING_RECEIPT', 'WAITING_CHECK')")
-            turnover = (await cur.fetchone())[0]
-
-            # Today's applications
-            today = dt.datetime.utcnow().strftime("%Y-%m-%d")
-            cur = await db.execute("SELECT COUNT(*) FROM applications WHERE created_at LIKE ?", (f"{today}%",))
+        async with self._read() as db:
+            # Итоги из stats_counters (ведутся триггерами)
+            cur = await db.execute("SELECT name, value FROM stats_counters")
+            counters = dict(await cur.fetchall())
+
+            # Today's applications: диапазон по индексу idx_applications_created_at
+            today = now_iso()[:10]
+            cur = await db.execute("SELECT COUNT(*) FROM applications WHERE created_at >= ?", (today,))
             today_apps = (await cur.fetchone())[0]
 
             return {
-                "total_applications": total_apps,
-                "total_users": total_users,
-                "turnover": turnover,
+                "total_applications": int(counters.get("total_applications", 0)),
+                "total_users": int(counters.get("total_users", 0)),
+                "turnover": counters.get("turnover", 0),
                 "today_applications": today_apps
             }
 
     async def get_user_stats(self, tg_id: int) -> dict[str, Any]:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             # Total user applications
             cur = await db.execute("SELECT COUNT(*) FROM applications WHERE user_tg_id=?", (tg_id,))
             total_apps = (await cur.fetchone())[0]
@@ -563,12 +736,12 @@ class Database:
 
     # === Referrals ===
     async def get_referral_count(self, tg_id: int) -> int:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute("SELECT COUNT(*) FROM referrals WHERE referrer_tg_id=?", (tg_id,))
             return (await cur.fetchone())[0]
 
     async def add_referral(self, referrer_tg_id: int, referred_tg_id: int, bonus_uah: float = 0) -> bool:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             try:
                 await db.execute(
                     "INSERT INTO referrals (referrer_tg_id, referred_tg_id, bonus_uah, created_at) VALUES (?, ?, ?, ?)",
@@ -581,11 +754,12 @@ class Database:
                 await db.commit()
                 return True
             except Exception:
+                await db.rollback()
                 return False
 
     # === Notifications ===
     async def create_notification(self, user_tg_id: int, type: str, title: str, message: str, data: str | None = None) -> int:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             cur = await db.execute(
                 """INSERT INTO notifications (user_tg_id, type, title, message, data, created_at)
                    VALUES (?, ?, ?, ?, ?, ?)""",
@@ -595,7 +769,7 @@ class Database:
             return cur.lastrowid
 
     async def get_user_notifications(self, user_tg_id: int, limit: int = 20) -> list[dict[str, Any]]:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute(
                 """SELECT id, type, title, message, is_read, data, created_at
                    FROM notifications WHERE user_tg_id=? ORDER BY id DESC LIMIT ?""",
@@ -616,7 +790,7 @@ class Database:
             ]
 
     async def mark_notification_read(self, notification_id: int, user_tg_id: int) -> bool:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             cur = await db.execute(
                 "UPDATE notifications SET is_read=1 WHERE id=? AND user_tg_id=?",
                 (notification_id, user_tg_id)
@@ -625,7 +799,7 @@ class Database:
             return cur.rowcount == 1
 
     async def get_unread_notifications_count(self, user_tg_id: int) -> int:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute(
                 "SELECT COUNT(*) FROM notifications WHERE user_tg_id=? AND is_read=0",
                 (user_tg_id,)
@@ -634,13 +808,13 @@ class Database:
 
     # === Broadcast ===
     async def get_all_users(self) -> list[int]:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute("SELECT tg_id FROM users")
             rows = await cur.fetchall()
             return [r[0] for r in rows]
 
     async def log(self, tg_id: int | None, action: str, payload: str | None = None) -> None:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._write() as db:
             await db.execute(
                 "INSERT INTO audit_log (tg_id, action, payload, created_at) VALUES (?, ?, ?, ?)",
                 (tg_id, action, payload, now_iso()),
@@ -282,9 +282,7 @@ async def amount_entered(message: Message, state: FSMContext, db, bot, config, l
     await message.delete()
 
     # Генерируем код платежа
-    import random
-    import string
-    payment_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+    payment_code = gen_payment_code()
     
     requisites = bank.get("requisites_text", "").strip()
     has_requisites = requisites and len(requisites) > 5 and "не заданы" not in requisites
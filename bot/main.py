@@ -49,7 +49,7 @@ async def _notification_loop(bot: Bot, db: Database, logger: logging.Logger):
             logger.exception("notification loop error: %s", e)
         await asyncio.sleep(60)
 
-async def _run():
+async def main_async():
     config = load_config()
     logging.basicConfig(
         level=logging.INFO,
@@ -62,36 +62,46 @@ async def _run():
     dp = Dispatcher(storage=MemoryStorage())
 
     db = Database(config.db_path)
-    await db.init()
+    tasks: list[asyncio.Task] = []
+    try:
+        await db.init()
 
-    # seed countries if empty
-    countries = await db.list_countries(active_only=False)
-    if not countries:
-        await db.upsert_country("Украина")
-        default_country_id = (await db.list_countries(active_only=False))[0][0]
+        # seed countries if empty
+        countries = await db.list_countries(active_only=False)
+        if not countries:
+            await db.upsert_country("Украина")
+            default_country_id = (await db.list_countries(active_only=False))[0][0]
 
-        banks = await db.list_banks(active_only=False)
-        if not banks:
-            await db.upsert_bank("Моно Банк", "Карта: ....\nФИО: ....\nНазначение: ....", default_country_id)
-            await db.upsert_bank("Приват Банк", "Карта: ....\nФИО: ....\nНазначение: ....", default_country_id)
+            banks = await db.list_banks(active_only=False)
+            if not banks:
+                await db.upsert_bank("Моно Банк", "Карта: ....\nФИО: ....\nНазначение: ....", default_country_id)
+                await db.upsert_bank("Приват Банк", "Карта: ....\nФИО: ....\nНазначение: ....", default_country_id)
 
-    # Include routers
-    dp.include_router(user_router)
-    dp.include_router(apps_router)
-    dp.include_router(merchant_router)
-    dp.include_router(payments_router)
-    dp.include_router(admin_router)
-    dp.include_router(chat_router)
+        # Include routers
+        dp.include_router(user_router)
+        dp.include_router(apps_router)
+        dp.include_router(merchant_router)
+        dp.include_router(payments_router)
+        dp.include_router(admin_router)
+        dp.include_router(chat_router)
 
-    # Start background tasks
-    asyncio.create_task(_expire_loop(bot, db, logger))
-    asyncio.create_task(_notification_loop(bot, db, logger))
+        # Start background tasks
+        tasks += [
+            asyncio.create_task(_expire_loop(bot, db, logger)),
+            asyncio.create_task(_notification_loop(bot, db, logger)),
+        ]
 
-    logger.info("Bot v5.0 started with WebApp support")
-    await dp.start_polling(bot, config=config, db=db, logger=logger)
+        logger.info("Bot v5.0 started with WebApp support")
+        await dp.start_polling(bot, config=config, db=db, logger=logger)
+    finally:
+        # Соединения БД держат не-daemon потоки: без close() процесс не выйдет
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await db.close()
 
 def main():
-    asyncio.run(_run())
+    asyncio.run(main_async())
 
 if __name__ == "__main__":
     main()
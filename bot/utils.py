@@ -2,12 +2,15 @@
 Утилиты для бота
 """
 from __future__ import annotations
-import random
+import os
 import string
 
+_CODE_ALPHABET = (string.ascii_uppercase + string.digits).encode()
+_ALPHA_LEN = len(_CODE_ALPHABET)
+
 def gen_payment_code(length: int = 6) -> str:
-    """Генерирует случайный код платежа"""
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
+    """Генерирует случайный код платежа (os.urandom, алфавит A-Z0-9)"""
+    return bytes(_CODE_ALPHABET[b % _ALPHA_LEN] for b in os.urandom(length)).decode()
 
 def format_amount(amount: float) -> str:
     """Форматирует сумму"""
@@ -1,18 +1,18 @@
 #!/usr/bin/env python3
 import sys
 import os
-import threading
-import time
+import asyncio
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-def run_api():
+def run_api(workers: int = 1):
     """Запуск API сервера"""
     import uvicorn
-    from bot.api.webapp_api import app
     port = int(os.environ.get('PORT', 8000))
-    print(f"🚀 API on port {port}")
-    uvicorn.run(app, host="0.0.0.0", port=port, log_level="warning")
+    print(f"🚀 API on port {port} (workers: {workers})")
+    # Приложение передаем строкой: так uvicorn может поднять несколько воркеров.
+    # loop/http по умолчанию "auto" — берутся uvloop и httptools из uvicorn[standard].
+    uvicorn.run("bot.api.webapp_api:app", host="0.0.0.0", port=port, workers=workers, log_level="warning")
 
 def run_bot():
     """Запуск Telegram бота"""
@@ -20,17 +20,41 @@ def run_bot():
     from bot.main import main
     main()
 
+def run_both():
+    """API и бот в одном процессе и одном event loop (API — один воркер)"""
+    import uvicorn
+    port = int(os.environ.get('PORT', 8000))
+    config = uvicorn.Config("bot.api.webapp_api:app", host="0.0.0.0", port=port, log_level="warning")
+    # Ставит политику uvloop, если он установлен (loop="auto")
+    config.setup_event_loop()
+    server = uvicorn.Server(config)
+
+    async def _run_all():
+        from bot.main import main_async
+        print(f"🚀 API on port {port}")
+        api_task = asyncio.create_task(server.serve())
+        try:
+            print("🤖 Bot starting...")
+            await main_async()
+        finally:
+            # Бот остановлен (сигналы перехватывает aiogram) — гасим и API
+            server.should_exit = True
+            await api_task
+
+    asyncio.run(_run_all())
+
 if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else "both"
+
     print("="*50)
-    print("🚀 NightLab Bot + WebApp API")
+    print(f"🚀 NightLab Bot + WebApp API ({mode})")
     print("="*50)
-    
-    # Запускаем API в отдельном потоке
-    api_thread = threading.Thread(target=run_api, daemon=True)
-    api_thread.start()
-    
-    # Даем API время стартовать
-    time.sleep(3)
-    
-    # Запускаем бота (основной поток)
-    run_bot()
+
+    if mode == "api":
+        # Отдельный API-процесс: воркеров по числу ядер (или WEB_CONCURRENCY).
+        # Несколько воркеров делят один файл БД — это держит WAL-режим.
+        run_api(workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    elif mode == "bot":
+        run_bot()
+    else:
+        run_both()
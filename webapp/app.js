@@ -552,38 +552,55 @@ function resetForm() {
 }
 
 // API Helpers
-async function apiGet(endpoint) {
-    const response = await fetch(`${CONFIG.API_URL}${endpoint}`, {
-        headers: {
-            'X-Init-Data': initData || 'test_mode',
-            'Content-Type': 'application/json'
-        }
-    });
-    
+
+// Сессия в HttpOnly-куке: initData перестаем слать только после того,
+// как кука реально сработала (ответ с X-Auth-Cache: hit).
+//   none     — шлем initData, ждем X-Auth-Session от сервера
+//   probe    — кука выдана, следующий запрос идет без initData для проверки
+//   ready    — кука работает, initData не шлем
+//   disabled — браузер куку не хранит (iframe, блокировка cookies),
+//              initData шлем до конца жизни страницы
+let sessionState = 'none';
+
+async function apiRequest(endpoint, options = {}) {
+    const headers = { 'Content-Type': 'application/json' };
+    const withInitData = sessionState === 'none' || sessionState === 'disabled';
+    if (withInitData) {
+        headers['X-Init-Data'] = initData || 'test_mode';
+    }
+
+    const response = await fetch(`${CONFIG.API_URL}${endpoint}`, { ...options, headers });
+
+    if (response.status === 401 && !withInitData) {
+        sessionState = 'disabled';
+        return apiRequest(endpoint, options);
+    }
+
     if (!response.ok) {
         const text = await response.text();
         throw new Error(`API error ${response.status}: ${text}`);
     }
-    
+
+    if (response.headers.get('X-Auth-Cache') === 'hit') {
+        if (sessionState === 'probe') {
+            sessionState = 'ready';
+        }
+    } else if (sessionState === 'none' && response.headers.has('X-Auth-Session')) {
+        sessionState = 'probe';
+    }
+
     return response.json();
 }
 
+async function apiGet(endpoint) {
+    return apiRequest(endpoint);
+}
+
 async function apiPost(endpoint, data) {
-    const response = await fetch(`${CONFIG.API_URL}${endpoint}`, {
+    return apiRequest(endpoint, {
         method: 'POST',
-        headers: {
-            'X-Init-Data': initData || 'test_mode',
-            'Content-Type': 'application/json'
-        },
         body: JSON.stringify(data)
     });
-    
-    if (!response.ok) {
-        const text = await response.text();
-        throw new Error(`API error ${response.status}: ${text}`);
-    }
-    
-    return response.json();
 }
 
 // Utilities